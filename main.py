@@ -1,8 +1,10 @@
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 import os
 import sys
 import time
+from collections import deque
 
 # API配置
 DEEPSEEK_API_KEY = "DS_API_KEY"
@@ -14,24 +16,232 @@ OPENAI_API_KEY = "OPENAI_API_KEY"
 OPENAI_BASE_URL = "https://api.openai.com/v1/chat/completions"
 
 # 设置 Socks5 代理
-proxies = {
-    "http": "socks5h://127.0.0.1:1080",
-    "https": "socks5h://127.0.0.1:1080"
-}
+PROXY_URL = "socks5://127.0.0.1:1080"
 
 CONVERSATION_MAX_HISTORY = 100
+# 截断缓冲轮次：超出 max_history 这么多轮后才一次性截断，
+# 保证消息前缀在多轮内保持字节级稳定，避免每轮都使服务端的 prompt cache 失效
+CONVERSATION_CACHE_BUFFER = 8
+# 超过这么多轮后，把最旧的一批轮次压缩成一条摘要，而不是无声丢弃
+CONVERSATION_SUMMARIZE_THRESHOLD = 40
+# 每次压缩的轮次数
+CONVERSATION_SUMMARIZE_BATCH = 20
+# 对话历史的追加式持久化日志，重启后回放恢复上下文
+CONVERSATION_LOG_PATH = "conversation_history.jsonl"
+# 历史里保留的推理内容长度上限：推理不会被重新发给任何 API，
+# 只为 #history 预览保留开头，避免每轮 5-20 KB 的纯内存/日志膨胀
+CONVERSATION_REASONING_LIMIT = 512
+
+# OpenAI 的系统提示词，保持字节级稳定以命中服务端 prompt cache
+OPENAI_SYSTEM_PROMPT = {
+    "role": "system",
+    "content": "You are a helpful assistant. Use the provided reasoning to answer questions in context of the conversation history."
+}
+
+# 请求超时：连接 5 秒，整体 120 秒
+REQUEST_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+
+
+def _build_client(use_proxy=False):
+    """
+    创建启用 HTTP/2 的 httpx 客户端：同一主机的请求复用一条
+    keep-alive 连接并可多路复用，头部走 HPACK 压缩
+
+    Args:
+        use_proxy (bool): 是否使用 Socks5 代理
+
+    Returns:
+        httpx.AsyncClient: 配置好的客户端对象
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,
+        proxy=PROXY_URL if use_proxy else None,
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=8)
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=REQUEST_TIMEOUT,
+        # 显式声明 gzip：SSE 流里的长推理文本压缩率可达数倍，
+        # httpx 会在 iter_bytes 中透明解压；对端不支持时自动退回明文
+        headers={"Accept-Encoding": "gzip"}
+    )
+
+
+# 模块级客户端，避免每次提问都重新进行 TLS 握手
+_deepseek_client = _build_client()
+_openai_client = _build_client(use_proxy=True)
+
+
+async def _prewarm_openai_connection():
+    """
+    预热 OpenAI 的 TCP+TLS 连接并放回连接池，
+    让随后的正式请求跳过握手开销
+    """
+    try:
+        await _openai_client.head(OPENAI_BASE_URL, timeout=5.0)
+    except httpx.HTTPError:
+        # 预热失败不影响正式请求，只是少省一次握手
+        pass
+
+
+def _preview(text, limit=50):
+    """
+    生成历史摘要用的截断预览
+
+    Args:
+        text (str): 原始文本
+        limit (int): 预览长度上限
+
+    Returns:
+        str: 截断后的预览，超长时以 ... 结尾
+    """
+    return text[:limit] + ('...' if len(text) > limit else '')
+
+
+class _StdoutBatcher:
+    """
+    合并流式增量的 stdout 写入：攒够 64 字符或距上次刷新超过
+    16ms 才真正 write+flush，把每 token 一次的 write 系统调用
+    降到每批一次，观感上仍是实时流式输出
+    """
+
+    def __init__(self, max_chars=64, max_delay=0.016):
+        self._pending = []
+        self._pending_len = 0
+        self._max_chars = max_chars
+        self._max_delay = max_delay
+        self._last_flush = time.monotonic()
+
+    def write(self, text):
+        """
+        缓冲一段增量，达到字符数或时间阈值时刷新
+        """
+        self._pending.append(text)
+        self._pending_len += len(text)
+        now = time.monotonic()
+        if (self._pending_len >= self._max_chars
+                or now - self._last_flush > self._max_delay):
+            self.flush(now)
+
+    def flush(self, now=None):
+        """
+        把缓冲的内容一次性写出并刷新 stdout
+        """
+        if self._pending:
+            sys.stdout.write("".join(self._pending))
+            sys.stdout.flush()
+            self._pending.clear()
+            self._pending_len = 0
+        self._last_flush = now if now is not None else time.monotonic()
+
+
+async def _iter_sse_lines(response):
+    """
+    以 8 KiB 块读取流式响应并手工按 b'\\n' 切分，
+    避免 iter_lines 纯 Python 逐字符扫描的开销
+
+    Args:
+        response: 流式的响应对象
+
+    Yields:
+        bytes: 去掉行尾 \\r\\n 的非空行
+    """
+    buf = bytearray()
+    async for chunk in response.aiter_bytes(chunk_size=8192):
+        if not chunk:
+            continue
+        buf += chunk
+        # bytearray 原地切分，find/del 都是 C 级操作
+        while (nl := buf.find(b"\n")) != -1:
+            line = bytes(buf[:nl]).rstrip(b"\r")
+            del buf[:nl + 1]
+            if line:
+                yield line
+    if buf:
+        line = bytes(buf).rstrip(b"\r")
+        if line:
+            yield line
 
 
 class ConversationHistory:
-    def __init__(self, max_history=CONVERSATION_MAX_HISTORY):
+    def __init__(self, max_history=CONVERSATION_MAX_HISTORY,
+                 recent_message_cache_buffer=CONVERSATION_CACHE_BUFFER,
+                 summarize_threshold=CONVERSATION_SUMMARIZE_THRESHOLD,
+                 persist_path=None):
         """
         初始化对话历史记录类
 
         Args:
             max_history (int): 保留的最大对话轮次
+            recent_message_cache_buffer (int): 截断前额外容忍的轮次，
+                避免每轮截断导致消息前缀变化、prompt cache 失效
+            summarize_threshold (int): 触发摘要压缩的轮次阈值，
+                传 0 或 None 则退回纯滑动窗口
+            persist_path (str, optional): 追加式 JSONL 日志路径；
+                启动时回放最近 max_history 轮，每轮追加写入一行
         """
-        self.history = []
+        # deque 在超出 maxlen 时自动淘汰最旧一轮，追加为 O(1)，无需切片复制
+        self.history = deque(maxlen=max_history)
+        # 规范化的 {"role", "content"} 消息列表，发给两个 API 时前缀保持字节级一致
+        self.messages = []
+        # 预拼好系统提示的 OpenAI 前缀，与 self.messages 共享同一批消息字典，
+        # 增量维护，避免每次请求都重新拼接整个列表
+        self._openai_prefix = [OPENAI_SYSTEM_PROMPT]
         self.max_history = max_history
+        self.recent_message_cache_buffer = recent_message_cache_buffer
+        self.summarize_threshold = summarize_threshold
+        # 被压缩掉的早期轮次的累积摘要；非空时作为系统消息随前缀发送
+        self.summary = ""
+        self._summary_message = None
+
+        self._log = None
+        if persist_path:
+            self._load_persisted(persist_path)
+            # 无缓冲追加写，每轮一行，O(1) 且崩溃后可恢复
+            self._log = open(persist_path, "ab", buffering=0)
+
+    def _load_persisted(self, path):
+        """
+        从持久化日志回放最近 max_history 轮，重建内存状态
+
+        Args:
+            path (str): JSONL 日志路径
+        """
+        try:
+            with open(path, "rb") as f:
+                # deque 直接消费文件迭代器，只保留尾部 max_history 行
+                tail = deque(f, maxlen=self.max_history)
+        except OSError:
+            return
+
+        for raw in tail:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                entry = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                continue
+            self.history.append(entry)
+            user_message = {"role": "user", "content": entry.get("user_query", "")}
+            assistant_message = {"role": "assistant", "content": entry.get("ai_response", "")}
+            self.messages.append(user_message)
+            self.messages.append(assistant_message)
+            self._openai_prefix.append(user_message)
+            self._openai_prefix.append(assistant_message)
+
+    def clear(self):
+        """
+        清空内存中的历史，并截断持久化日志（如启用）
+        """
+        self.history.clear()
+        self.messages.clear()
+        del self._openai_prefix[1:]
+        self.summary = ""
+        self._summary_message = None
+        if self._log is not None:
+            self._log.truncate(0)
 
     def add_interaction(self, user_query,
                         reasoning, ai_response):
@@ -43,42 +253,137 @@ class ConversationHistory:
             reasoning (str): DeepSeek的推理内容
             ai_response (str): OpenAI的回答
         """
-        self.history.append({
+        now = time.time()
+        entry = {
             "user_query": user_query,
-            "reasoning": reasoning,
+            # 只存推理开头：完整推理已经用完，后续不会再发给任何 API
+            "reasoning": _preview(reasoning, CONVERSATION_REASONING_LIMIT) if reasoning else "",
             "ai_response": ai_response,
-            "timestamp": time.time()
-        })
+            "timestamp": now,
+            # 插入时一次性格式化，#history 摘要就只剩纯字符串拼接
+            "timestamp_str": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "user_query_preview": _preview(user_query),
+            "ai_response_preview": _preview(ai_response)
+        }
+        self.history.append(entry)
+
+        # 每轮追加一行到持久化日志，写入量与历史长度无关
+        if self._log is not None:
+            self._log.write(orjson.dumps(entry) + b"\n")
+
+        user_message = {"role": "user", "content": user_query}
+        assistant_message = {"role": "assistant", "content": ai_response}
+        self.messages.append(user_message)
+        self.messages.append(assistant_message)
+        self._openai_prefix.append(user_message)
+        self._openai_prefix.append(assistant_message)
+
+        # 消息列表带缓冲截断：超出 max_history + buffer 轮后才一次性截回 max_history 轮，
+        # 这样前缀在 buffer 轮内保持稳定，prompt cache 只在截断时失效一次
+        max_messages = 2 * (self.max_history + self.recent_message_cache_buffer)
+        if len(self.messages) > max_messages:
+            dropped = len(self.messages) - 2 * self.max_history
+            del self.messages[:dropped]
+            base = self._prefix_base()
+            del self._openai_prefix[base:base + dropped]
+
+    def needs_compaction(self):
+        """
+        判断是否超过摘要阈值、应当触发一次压缩
 
-        # 如果历史记录超过最大限制，删除最旧的
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
+        Returns:
+            bool: 是否需要压缩
+        """
+        return bool(self.summarize_threshold) and \
+            len(self.messages) > 2 * self.summarize_threshold
 
-    def get_conversation_for_deepseek(self):
+    def _prefix_base(self):
         """
-        为DeepSeek构建包含历史上下文的消息列表
+        返回 _openai_prefix 中历史消息的起始下标
+        （系统提示之后，可能还有一条摘要消息）
+        """
+        return 2 if self._summary_message is not None else 1
 
-        Returns:
-            list: 消息列表
+    async def compact(self):
         """
-        messages = []
+        调用 DeepSeek 把最旧的一批对话轮次压缩成一条摘要，
+        在控制每轮请求体大小的同时保留早期对话的要点。
+        失败时静默放弃，退化为原有的滑动窗口行为。
 
-        # 添加历史交互
-        for interaction in self.history:
-            messages.append({
+        Returns:
+            bool: 压缩是否成功
+        """
+        batch = self.messages[:2 * CONVERSATION_SUMMARIZE_BATCH]
+        if not batch:
+            return False
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in batch)
+        data = {
+            "model": "deepseek-r1-250120",
+            "messages": [{
                 "role": "user",
-                "content": interaction["user_query"]
-            })
-            messages.append({
-                "role": "assistant",
-                "content": interaction["ai_response"]
-            })
+                "content": "Summarize the following conversation in at most 500 tokens. "
+                           "Keep key facts, decisions and user preferences:\n\n" + transcript
+            }],
+            "stream": False
+        }
 
-        return messages
+        try:
+            response = await _deepseek_client.post(
+                DEEPSEEK_BASE_URL,
+                headers={"Authorization": f"Bearer {DEEPSEEK_API_KEY}"},
+                json=data
+            )
+            if response.status_code != 200:
+                return False
+            summary_text = response.json()["choices"][0]["message"]["content"]
+        except (httpx.HTTPError, KeyError, IndexError, ValueError):
+            return False
+
+        # 摘要按时间顺序累积：旧摘要在前，新压缩的轮次在后
+        if self.summary:
+            self.summary = f"{self.summary}\n\n{summary_text}"
+        else:
+            self.summary = summary_text
+
+        # 把被压缩的轮次从消息列表和 OpenAI 前缀中移除
+        base = self._prefix_base()
+        del self._openai_prefix[base:base + len(batch)]
+        del self.messages[:len(batch)]
+
+        # 更新前缀里的摘要系统消息（下标 1，紧跟系统提示）
+        summary_message = {
+            "role": "system",
+            "content": f"Summary of earlier conversation:\n{self.summary}"
+        }
+        if self._summary_message is not None:
+            self._openai_prefix[1] = summary_message
+        else:
+            self._openai_prefix.insert(1, summary_message)
+        self._summary_message = summary_message
+        return True
+
+    def get_conversation_for_deepseek(self, current_query):
+        """
+        为DeepSeek构建包含历史上下文的消息列表
+
+        Args:
+            current_query (str): 当前用户的问题
+
+        Returns:
+            list: 消息列表
+        """
+        # 单次拼接复用缓存的前缀，历史部分无需重建
+        current = [{"role": "user", "content": current_query}]
+        if self._summary_message is not None:
+            return [self._summary_message] + self.messages + current
+        return self.messages + current
 
     def get_conversation_for_openai(self, current_query, current_reasoning):
         """
-        为OpenAI构建包含历史上下文的消息列表
+        为OpenAI构建包含历史上下文的消息列表。
+        前缀（系统提示 + 历史消息）跨轮保持字节级一致以命中 prompt cache，
+        推理内容作为独立的尾部消息注入，而不是拼进用户文本。
 
         Args:
             current_query (str): 当前用户的问题
@@ -87,30 +392,12 @@ class ConversationHistory:
         Returns:
             list: 消息列表
         """
-        messages = [
-            {"role": "system",
-             "content": "You are a helpful assistant. Use the provided reasoning to answer questions in context of the conversation history."}
+        # 单次拼接复用缓存的前缀，历史部分无需重建
+        return self._openai_prefix + [
+            {"role": "user", "content": current_query},
+            {"role": "system", "content": f"Reasoning hint:\n{current_reasoning}"}
         ]
 
-        # 添加历史交互
-        for interaction in self.history:
-            messages.append({
-                "role": "user",
-                "content": interaction["user_query"]
-            })
-            messages.append({
-                "role": "assistant",
-                "content": interaction["ai_response"]
-            })
-
-        # 添加当前问题和推理内容
-        messages.append({
-            "role": "user",
-            "content": f"Answer the following question: {current_query}\n\nAccording to the reasoning prompt: {current_reasoning}\n\nBased on this reasoning and our conversation history, provide your answer to the question."
-        })
-
-        return messages
-
     def get_summary(self):
         """
         获取对话历史的摘要
@@ -121,16 +408,21 @@ class ConversationHistory:
         if not self.history:
             return "No conversation history yet."
 
-        summary = f"Conversation History ({len(self.history)} interactions):\n"
+        # 列表收集 + 一次 join，避免循环内字符串拼接
+        rows = [f"Conversation History ({len(self.history)} interactions):\n"]
 
         for i, interaction in enumerate(self.history, 1):
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(interaction["timestamp"]))
-            summary += f"\n{i}. {timestamp}\nUser: {interaction['user_query'][:50]}{'...' if len(interaction['user_query']) > 50 else ''}\nAI: {interaction['ai_response'][:50]}{'...' if len(interaction['ai_response']) > 50 else ''}\n"
+            # 预格式化字段在插入时生成；旧日志回放的条目没有，现场补算
+            timestamp = (interaction.get("timestamp_str")
+                         or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(interaction["timestamp"])))
+            user_preview = interaction.get("user_query_preview") or _preview(interaction["user_query"])
+            ai_preview = interaction.get("ai_response_preview") or _preview(interaction["ai_response"])
+            rows.append(f"\n{i}. {timestamp}\nUser: {user_preview}\nAI: {ai_preview}\n")
 
-        return summary
+        return "".join(rows)
 
 
-def get_deepseek_reasoning_stream(prompt, conversation_history=None):
+async def get_deepseek_reasoning_stream(prompt, conversation_history=None):
     """
     流式调用DeepSeek API并实时输出reasoning_content，
     一旦收集完reasoning_content就终止请求
@@ -145,19 +437,16 @@ def get_deepseek_reasoning_stream(prompt, conversation_history=None):
     print("\nDeepSeek reasoning content:")
     sys.stdout.flush()
 
-    # DeepSeek 请求头
+    # DeepSeek 请求头（Content-Type 由 httpx 的 json= 参数自动设置）
     headers = {
-        "Content-Type": "application/json",
         "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
     }
 
-    # 准备消息，包含历史上下文
-    messages = []
+    # 准备消息，包含历史上下文和当前问题
     if conversation_history:
-        messages = conversation_history.get_conversation_for_deepseek()
-
-    # 添加当前问题
-    messages.append({"role": "user", "content": prompt})
+        messages = conversation_history.get_conversation_for_deepseek(prompt)
+    else:
+        messages = [{"role": "user", "content": prompt}]
 
     # DeepSeek 请求体
     data = {
@@ -166,39 +455,59 @@ def get_deepseek_reasoning_stream(prompt, conversation_history=None):
         "stream": True
     }
 
-    # 发送请求到 DeepSeek API
-    response = requests.post(
+    # 发送请求到 DeepSeek API（HTTP/2 流式请求，with 退出时自动关闭响应）
+    async with _deepseek_client.stream(
+        "POST",
         DEEPSEEK_BASE_URL,
         headers=headers,
-        data=json.dumps(data),
-        stream=True
-    )
-
-    # 检查响应状态
-    if response.status_code != 200:
-        print(f"DeepSeek API Error: {response.status_code}")
-        print(response.text)
-        return None
-
-    # 处理 DeepSeek 的流式响应
-    reasoning_content = ""
-    reasoning_finished = False
-    last_reasoning_content_time = None
-
-    for line in response.iter_lines():
-        if not line:
-            continue
+        json=data
+    ) as response:
+        # 检查响应状态
+        if response.status_code != 200:
+            await response.aread()  # 流模式下需先读完响应体才能访问 text
+            print(f"DeepSeek API Error: {response.status_code}")
+            print(response.text)
+            return None
+
+        # 处理 DeepSeek 的流式响应
+        # 增量先收集到列表，循环后一次 join，避免 O(N²) 的字符串拼接
+        reasoning_parts = []
+        last_reasoning_content_time = None
+
+        # 批量写 stdout，减少每 token 一次的系统调用
+        out = _StdoutBatcher()
+
+        async for line in _iter_sse_lines(response):
+            # 跳过 SSE 注释行（keep-alive）
+            if line[0:1] == b':':
+                continue
 
-        # 移除 "data: " 前缀并解析 JSON
-        if line.startswith(b'data: '):
+            # 非 data 帧直接丢弃；字节切片比较比 startswith 少一次方法分派
+            if line[:6] != b'data: ':
+                continue
             line = line[6:]  # 移除 "data: " 前缀
 
             # 处理流结束标记
             if line == b'[DONE]':
                 break
 
+            # 子串预过滤：不含任何关心字段的帧（纯角色帧等簿记帧）
+            # 直接跳过，C 级子串扫描远比一次 JSON 解析便宜
+            if (b'reasoning_content' not in line
+                    and b'"content"' not in line
+                    and b'finish_reason' not in line):
+                continue
+
+            # 推理阶段结束的廉价信号：收到过 reasoning_content 之后，
+            # 首次在原始字节里出现正式回答字段就立刻终止，
+            # 连最后一帧的 JSON 解析都省掉，尽早把连接交还给 OpenAI 请求
+            if (last_reasoning_content_time is not None
+                    and b'reasoning_content' not in line
+                    and b'"content":"' in line):
+                break
+
             try:
-                chunk = json.loads(line)
+                chunk = orjson.loads(line)
 
                 # 检查是否有finish_reason，表示推理内容已完成
                 if 'choices' in chunk and chunk['choices'] and 'finish_reason' in chunk['choices'][0]:
@@ -218,30 +527,27 @@ def get_deepseek_reasoning_stream(prompt, conversation_history=None):
                         # 只处理非空内容
                         if delta['reasoning_content']:
                             # 流式输出
-                            print(delta['reasoning_content'], end="")
-                            sys.stdout.flush()  # 确保立即输出，不缓冲
-                            reasoning_content += delta['reasoning_content']
+                            out.write(delta['reasoning_content'])
+                            reasoning_parts.append(delta['reasoning_content'])
 
                     # 检查reasoning_content是否已经完成
                     # 如果在delta中看到content而不是reasoning_content，说明已转到正常输出阶段
                     elif 'content' in delta and last_reasoning_content_time is not None:
                         # 已收到过reasoning_content并现在开始收到content，可以终止流
-                        reasoning_finished = True
                         break
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Error decoding JSON: {e}")
                 continue
 
-    # 如果我们主动终止了响应，需要关闭响应连接
-    if reasoning_finished:
-        response.close()
+        # 写出批量缓冲中剩余的增量
+        out.flush()
 
     print("\n")  # 在推理内容结束后添加换行
-    return reasoning_content
+    return "".join(reasoning_parts)
 
 
-def get_openai_answer_stream(prompt, reasoning_content, conversation_history=None):
+async def get_openai_answer_stream(prompt, reasoning_content, conversation_history=None):
     """
     流式调用OpenAI API并实时输出回答
 
@@ -256,9 +562,8 @@ def get_openai_answer_stream(prompt, reasoning_content, conversation_history=Non
     print("\nGPT-4o Answer:")
     sys.stdout.flush()
 
-    # OpenAI 请求头
+    # OpenAI 请求头（Content-Type 由 httpx 的 json= 参数自动设置）
     headers = {
-        "Content-Type": "application/json",
         "Authorization": f"Bearer {OPENAI_API_KEY}"
     }
 
@@ -279,38 +584,48 @@ def get_openai_answer_stream(prompt, reasoning_content, conversation_history=Non
         "stream": True  # 启用流式响应
     }
 
-    # 发送请求到 OpenAI API
-    response = requests.post(
+    # 发送请求到 OpenAI API（HTTP/2 流式请求，代理已配置在客户端上）
+    async with _openai_client.stream(
+        "POST",
         OPENAI_BASE_URL,
         headers=headers,
-        data=json.dumps(data),
-        stream=True,  # 使用流式请求
-        proxies=proxies
-    )
-
-    # 检查响应状态
-    if response.status_code != 200:
-        print(f"OpenAI API Error: {response.status_code}")
-        print(response.text)
-        return None
-
-    # 处理 OpenAI 的流式响应
-    complete_answer = ""
-
-    for line in response.iter_lines():
-        if not line:
-            continue
+        json=data
+    ) as response:
+        # 检查响应状态
+        if response.status_code != 200:
+            await response.aread()  # 流模式下需先读完响应体才能访问 text
+            print(f"OpenAI API Error: {response.status_code}")
+            print(response.text)
+            return None
+
+        # 处理 OpenAI 的流式响应
+        # 增量先收集到列表，循环后一次 join，避免 O(N²) 的字符串拼接
+        answer_parts = []
+
+        # 批量写 stdout，减少每 token 一次的系统调用
+        out = _StdoutBatcher()
+
+        async for line in _iter_sse_lines(response):
+            # 跳过 SSE 注释行（keep-alive）
+            if line[0:1] == b':':
+                continue
 
-        # 移除 "data: " 前缀并解析 JSON
-        if line.startswith(b'data: '):
+            # 非 data 帧直接丢弃；字节切片比较比 startswith 少一次方法分派
+            if line[:6] != b'data: ':
+                continue
             line = line[6:]  # 移除 "data: " 前缀
 
             # 处理流结束标记
             if line == b'[DONE]':
                 break
 
+            # 子串预过滤：不含内容增量的帧（纯角色帧等簿记帧）
+            # 直接跳过，C 级子串扫描远比一次 JSON 解析便宜
+            if b'"content"' not in line:
+                continue
+
             try:
-                chunk = json.loads(line)
+                chunk = orjson.loads(line)
 
                 # 提取内容增量
                 if 'choices' in chunk and chunk['choices'] and 'delta' in chunk['choices'][0]:
@@ -318,19 +633,21 @@ def get_openai_answer_stream(prompt, reasoning_content, conversation_history=Non
 
                     if 'content' in delta and delta['content']:
                         # 流式输出
-                        print(delta['content'], end="")
-                        sys.stdout.flush()  # 确保立即输出，不缓冲
-                        complete_answer += delta['content']
+                        out.write(delta['content'])
+                        answer_parts.append(delta['content'])
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Error decoding JSON: {e}")
                 continue
 
+        # 写出批量缓冲中剩余的增量
+        out.flush()
+
     print("\n")  # 在回答结束后添加换行
-    return complete_answer
+    return "".join(answer_parts)
 
 
-def process_question(user_prompt, conversation_history):
+async def process_question(user_prompt, conversation_history):
     """
     处理单个问题的完整流程
 
@@ -343,15 +660,20 @@ def process_question(user_prompt, conversation_history):
     """
     print(f"\nQuestion: {user_prompt}")
 
+    # 与 DeepSeek 流并发地预热 OpenAI 连接，
+    # 推理结束后第二个请求可直接复用已握手的连接
+    prewarm_task = asyncio.create_task(_prewarm_openai_connection())
+
     # 第一步：获取DeepSeek的推理内容（流式输出）
-    reasoning_content = get_deepseek_reasoning_stream(user_prompt, conversation_history)
+    reasoning_content = await get_deepseek_reasoning_stream(user_prompt, conversation_history)
 
     if reasoning_content is None:
         print("Failed to get reasoning content from DeepSeek.")
+        prewarm_task.cancel()
         return False
 
     # 第二步：获取OpenAI的回答（流式输出）
-    gpt4o_answer = get_openai_answer_stream(user_prompt, reasoning_content, conversation_history)
+    gpt4o_answer = await get_openai_answer_stream(user_prompt, reasoning_content, conversation_history)
 
     if gpt4o_answer is None:
         print("Failed to get answer from OpenAI.")
@@ -359,10 +681,53 @@ def process_question(user_prompt, conversation_history):
 
     # 将当前交互添加到历史记录
     conversation_history.add_interaction(user_prompt, reasoning_content, gpt4o_answer)
+
+    # 回答输出完毕后再做摘要压缩，不挡住当前轮的流式输出
+    if conversation_history.needs_compaction():
+        await conversation_history.compact()
+
     return True
 
 
-def interactive_mode():
+def _command_exit(conversation_history):
+    """
+    处理 #exit 命令：结束会话
+    """
+    print("Goodbye!")
+    return "exit"
+
+
+def _command_history(conversation_history):
+    """
+    处理 #history 命令：打印对话历史摘要
+    """
+    print(conversation_history.get_summary())
+    return "continue"
+
+
+def _command_clear(conversation_history):
+    """
+    处理 #clear 命令：清空历史记录并清屏
+    """
+    conversation_history.clear()
+    # Windows 系统
+    if os.name == 'nt':
+        os.system('cls')
+    # Mac 和 Linux 系统
+    else:
+        os.system('clear')
+    return "continue"
+
+
+# 命令分发表：输入归一化一次后 O(1) 查表，替代逐条字符串比较
+_COMMANDS = {
+    "#exit": _command_exit,
+    "#history": _command_history,
+    "#clear": _command_clear
+}
+
+
+async def interactive_mode():
     """
     交互式问答模式，支持上下文对话
     """
@@ -371,41 +736,30 @@ def interactive_mode():
     print("Type '#history' to see conversation history.")
     print("Type '#clear' to clear conversation history.")
 
-    # 初始化对话历史记录
-    conversation_history = ConversationHistory(max_history = CONVERSATION_MAX_HISTORY)
+    # 初始化对话历史记录（从持久化日志恢复上次会话）
+    conversation_history = ConversationHistory(max_history=CONVERSATION_MAX_HISTORY,
+                                               persist_path=CONVERSATION_LOG_PATH)
+
+    loop = asyncio.get_running_loop()
 
     while True:
         try:
-            # 显示提示符并获取用户输入
-            user_input = input("\n>>> ")
+            # 阻塞的 input() 放到线程池执行，不占用事件循环；只归一化一次
+            user_input = (await loop.run_in_executor(None, input, "\n>>> ")).strip()
 
-            # 检查是否退出
-            if user_input.lower() == '#exit':
-                print("Goodbye!")
-                break#
-
-            # 检查是否请求历史记录
-            if user_input.lower() == '#history':
-                print(conversation_history.get_summary())
-                continue
-
-            # 检查是否清除历史记录
-            if user_input.lower() == '#clear':
-                conversation_history = ConversationHistory(max_history=CONVERSATION_MAX_HISTORY)
-                # Windows 系统
-                if os.name == 'nt':
-                    os.system('cls')
-                # Mac 和 Linux 系统
-                else:
-                    os.system('clear')
+            # 处理空输入
+            if not user_input:
                 continue
 
-            # 处理空输入
-            if not user_input.strip():
+            # 命令查表分发（带空白的命令如 "  #exit " 也能命中）
+            handler = _COMMANDS.get(user_input.lower())
+            if handler is not None:
+                if handler(conversation_history) == "exit":
+                    break
                 continue
 
             # 处理用户问题
-            process_question(user_input, conversation_history)
+            await process_question(user_input, conversation_history)
 
         except KeyboardInterrupt:
             print("\nSession interrupted. Goodbye!")
@@ -420,7 +774,10 @@ def main():
     主函数，启动交互式问答模式
     """
     print("Starting AI Assistant with context memory...")
-    interactive_mode()
+    try:
+        asyncio.run(interactive_mode())
+    except KeyboardInterrupt:
+        print("\nSession interrupted. Goodbye!")
 
 
 if __name__ == "__main__":